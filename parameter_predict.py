@@ -3,6 +3,11 @@ from datetime import datetime, timedelta
 from thermal_time import APSIMWheatPhenology
 from tqdm import tqdm
 import os
+import sys
+import gzip
+import queue
+import signal
+import multiprocessing
 from multiprocessing import Pool
 
 
@@ -80,8 +85,143 @@ def assign_combination_number(Rp, Rv, Rp_values, Rv_values):
 def stage_div_to_str(stage_div):
     return '_'.join([f'{k}{v}' for k, v in stage_div.items()])
 
+
+def write_results(result_queue, error_queue, stop_event, output_folder, batch_prefix, batch_size, compression):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    batch = []
+    batch_number = 0
+    failed = False
+    while True:
+        try:
+            batch.append(result_queue.get(timeout=0.5))
+        except queue.Empty:
+            if not stop_event.is_set():
+                continue
+            if not batch:
+                break
+
+        if len(batch) >= batch_size or (batch and stop_event.is_set() and result_queue.empty()):
+            if not failed:
+                try:
+                    write_batch(batch, output_folder, f'{batch_prefix}_{batch_number:06d}', compression)
+                except Exception as e:
+                    error_queue.put(e)
+                    failed = True
+            batch = []
+            batch_number += 1
+
+
+def write_batch(batch, output_folder, batch_name, compression):
+    frames = [result.assign(Scenario=scenario) for scenario, result in batch]
+    data = pd.concat(frames, ignore_index=True).to_csv(index=False).encode('utf-8')
+
+    output_filename = f'{batch_name}.csv'
+    if compression == 'gzip':
+        output_filename += '.gz'
+        data = gzip.compress(data, compresslevel=1)
+
+    output_path = os.path.join(output_folder, output_filename)
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ResultWriter:
+    def __init__(self, output_folder, num_writers=1, max_queue_size=256, batch_size=64, compression=None,
+                 shutdown_timeout=60, run_id=None):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d%H%M%S')
+        self.result_queue = multiprocessing.Queue(maxsize=max_queue_size)
+        self.error_queue = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.failed_event = multiprocessing.Event()
+        self.shutdown_timeout = shutdown_timeout
+        self.closing = False
+        self.error = None
+        self.writers = [
+            multiprocessing.Process(target=write_results,
+                                    args=(self.result_queue, self.error_queue, self.stop_event, output_folder,
+                                          f'results_{self.run_id}_w{writer_id}', batch_size, compression))
+            for writer_id in range(num_writers)
+        ]
+        for writer in self.writers:
+            writer.start()
+
+    def check(self):
+        if self.error is None:
+            try:
+                self.error = self.error_queue.get_nowait()
+            except queue.Empty:
+                pass
+        if self.error is None:
+            for writer in self.writers:
+                if writer.exitcode not in (None, 0) or (not self.closing and not writer.is_alive()):
+                    self.error = RuntimeError(f'result writer {writer.name} stopped with exit code '
+                                              f'{writer.exitcode}; buffered results were lost')
+                    break
+        if self.error is not None:
+            self.failed_event.set()
+            raise self.error
+
+    def close(self, raise_error=True):
+        previous_error = self.error
+        self.closing = True
+        self.stop_event.set()
+        for writer in self.writers:
+            writer.join(self.shutdown_timeout)
+            if writer.is_alive():
+                writer.terminate()
+                writer.join()
+                self.result_queue.cancel_join_thread()
+        try:
+            self.check()
+        except Exception as e:
+            if raise_error:
+                raise
+            if e is not previous_error:
+                print(f'ResultWriter: {e!r}', file=sys.stderr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(raise_error=exc_type is None)
+
+
+_result_queue = None
+_writer_failed = None
+_cancelled = None
+
+
+def init_worker(result_queue, writer_failed, cancelled):
+    global _result_queue, _writer_failed, _cancelled
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _result_queue = result_queue
+    _writer_failed = writer_failed
+    _cancelled = cancelled
+
+
+def put_result(item):
+    while True:
+        try:
+            _result_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            if _writer_failed.is_set():
+                raise RuntimeError('result writer stopped; result was not written')
+
+
 def process_location_data(args):
-    file_path, location, sowing_date, stage_div, latitude, R_p, R_v, output_folder, Rp_values, Rv_values = args
+    if _cancelled.is_set():
+        return
+
+    file_path, location, sowing_date, stage_div, latitude, R_p, R_v, Rp_values, Rv_values = args
     daily_data = pd.read_csv(file_path)
     apsim_wheat = APSIMWheatPhenology(R_p=R_p, R_v=R_v, sowing_date=sowing_date)
     results_df = apsim_wheat.accumulate_daily_values(daily_data, latitude)
@@ -93,8 +233,17 @@ def process_location_data(args):
     result.loc[:, 'Parameter_set'] = combination_number
 
     stage_div_str = stage_div_to_str(stage_div)
-    output_filename = f'{location}_{sowing_date.strftime("%Y%m%d")}_Rp{R_p}_Rv{R_v}_{stage_div_str}.csv'
-    result.to_csv(os.path.join(output_folder, output_filename), index=False)
+    scenario = f'{location}_{sowing_date.strftime("%Y%m%d")}_Rp{R_p}_Rv{R_v}_{stage_div_str}'
+    put_result((scenario, result))
+
+
+def wait_for_result(results, writer):
+    while True:
+        try:
+            return results.next(timeout=1)
+        except multiprocessing.TimeoutError:
+            writer.check()
+
 
 def main():
     input_folder = './input/weather'
@@ -142,11 +291,24 @@ def main():
                 for R_p in Rp_values:
                     for R_v in Rv_values:
                         tasks.append((file_path, location_name, sowing_date, stage_div, latitude, R_p, R_v,
-                                      output_folder, Rp_values, Rv_values))
-
-    with Pool(processes=18) as pool:
-        for _ in tqdm(pool.imap_unordered(process_location_data, tasks), total=len(tasks)):
-            pass
+                                      Rp_values, Rv_values))
+
+    with ResultWriter(output_folder, compression='gzip') as writer:
+        cancelled = multiprocessing.Event()
+        with Pool(processes=18, initializer=init_worker,
+                  initargs=(writer.result_queue, writer.failed_event, cancelled)) as pool:
+            results = pool.imap_unordered(process_location_data, tasks)
+            try:
+                for _ in tqdm(range(len(tasks))):
+                    wait_for_result(results, writer)
+                    writer.check()
+            except KeyboardInterrupt:
+                cancelled.set()
+                pool.close()
+                pool.join()
+                raise
+            pool.close()
+            pool.join()
 
 if __name__ == '__main__':
     main()